@@ -3,6 +3,9 @@ import click_pathlib
 import logging
 from hotelbooking.models import models_utils
 from hotelbooking.models import model_utils_GS
+from hotelbooking.models import attribution
+from hotelbooking.models import search_store
+from hotelbooking.feature_cache import MAX_BYTES
 
 logger = logging.getLogger(__name__)
 
@@ -16,17 +19,43 @@ def main():
 @main.command()
 @click.option("--data-path", type=click_pathlib.Path(exists=True))
 @click.option("--model-version", type=int)
-def train_model(data_path, model_version):
-    models_utils.run(data_path, model_version)
+@click.option("--cache-dir", type=click_pathlib.Path(), default=None)
+@click.option("--cache-max-bytes", type=int, default=MAX_BYTES)
+def train_model(data_path, model_version, cache_dir, cache_max_bytes):
+    models_utils.run(data_path, model_version, cache_dir, cache_max_bytes)
     logger.info('Finished with training the model.')
 
 
 @main.command()
 @click.option("--data-path", type=click_pathlib.Path(exists=True))
 @click.option("--model-version", type=int)
-def optimise_model(data_path, model_version):
-    model_utils_GS.run(data_path, model_version)
+@click.option("--store-path", type=click_pathlib.Path(), default=None)
+@click.option("--eta", type=int, default=3)
+@click.option("--cache-dir", type=click_pathlib.Path(), default=None)
+@click.option("--cache-max-bytes", type=int, default=MAX_BYTES)
+@click.option("--lease", type=int, default=search_store.LEASE)
+def optimise_model(data_path, model_version, store_path, eta, cache_dir, cache_max_bytes, lease):
+    if cache_dir is not None and store_path is None:
+        raise click.UsageError("--cache-dir is only used by the resumable search; pass --store-path as well.")
+    model_utils_GS.run(data_path, model_version, store_path, eta, cache_dir, lease, cache_max_bytes)
     logger.info('Finished with optimising the model.')
 
 
+@main.command()
+@click.option("--data-path", type=click_pathlib.Path(exists=True))
+@click.option("--store-path", type=click_pathlib.Path(exists=True))
+@click.option("--cache-dir", type=click_pathlib.Path(), default=None)
+@click.option("--cache-max-bytes", type=int, default=MAX_BYTES)
+@click.option("--lease", type=int, default=search_store.LEASE)
+def search_worker(data_path, store_path, cache_dir, cache_max_bytes, lease):
+    model_utils_GS.run_worker(data_path, store_path, cache_dir, lease, cache_max_bytes)
+    logger.info('Finished with the search tasks.')
+
 
+@main.command()
+@click.option("--data-path", type=click_pathlib.Path(exists=True))
+@click.option("--model-version", type=int)
+@click.option("--output-path", type=click_pathlib.Path())
+def explain_anomalies(data_path, model_version, output_path):
+    attribution.run(data_path, model_version, output_path)
+    logger.info('Finished with explaining the anomalies.')
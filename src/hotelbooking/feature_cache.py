@@ -0,0 +1,193 @@
+"""
+Disk cache of fitted preprocessing and the feature matrices it produces.
+
+An entry holds a fitted preprocessor together with the transformed matrix of the data it was fitted on and
+of the data it was applied to (train/test, or the train/validation part of a fold), stored as float32 .npy
+files. Entries are reopened memory-mapped, so repeated experiments, parallel workers and later sessions
+share them without copying. The least recently used entries are evicted when the cache outgrows its budget.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import socket
+import time
+
+import numpy as np
+from sklearn.base import BaseEstimator
+
+from hotelbooking.utils import hash_frame, is_dead_local_process
+
+
+MAX_BYTES = 10 * 2 ** 30
+STALE_TMP_SECONDS = 3600
+TMP_MARKER = '.tmp-'
+
+PREPROCESSOR_FILE = 'preprocessor.pkl'
+FIT_FILE = 'X_fit.npy'
+APPLY_FILE = 'X_apply.npy'
+
+
+def _describe(value):
+    """
+    A stable description of a parameter value; estimators are described by their class, since their own
+    parameters are already part of get_params(deep=True).
+    """
+    if isinstance(value, BaseEstimator):
+        return type(value).__name__
+    if isinstance(value, (list, tuple)):
+        return [_describe(v) for v in value]
+    return repr(value)
+
+
+def cache_key(preprocessor, X_fit, X_apply, split=''):
+    """
+    The cache key of a preprocessor fitted on X_fit and applied to X_apply.
+    :param preprocessor: unfitted preprocessing pipeline
+    :param X_fit: X dataframe the preprocessor is fitted on
+    :param X_apply: X dataframe the fitted preprocessor is applied to
+    :param split: description of the split, e.g. its seed and fold
+    :return: hex digest
+    """
+    params = sorted((name, _describe(value)) for name, value in preprocessor.get_params(deep=True).items())
+    digest = hashlib.sha1()
+    for part in (hash_frame(X_fit), hash_frame(X_apply), split, type(preprocessor).__name__, repr(params)):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def _entry_size(path):
+    size = 0
+    for entry in os.scandir(path):
+        try:
+            if entry.is_file():
+                size += entry.stat().st_size
+        except FileNotFoundError:
+            pass
+    return size
+
+
+def _is_stale_tmp(name, mtime):
+    """
+    Whether a temporary entry was left behind by a writer that crashed: its process on this host is gone,
+    or (for writers on other hosts) it was not touched for STALE_TMP_SECONDS.
+    """
+    host, _, pid = name.rpartition(TMP_MARKER)[2].rpartition('-')
+    return is_dead_local_process(host, pid) or time.time() - mtime > STALE_TMP_SECONDS
+
+
+def load(cache_dir, key):
+    """
+    Reopen a cache entry and mark it as recently used.
+    :param cache_dir: cache directory
+    :param key: cache key
+    :return: (fitted preprocessor, memory-mapped X_fit, memory-mapped X_apply) or None on a cache miss
+    """
+    path = os.path.join(cache_dir, key)
+    try:
+        with open(os.path.join(path, PREPROCESSOR_FILE), 'rb') as file:
+            preprocessor = pickle.load(file)
+        Xt_fit = np.load(os.path.join(path, FIT_FILE), mmap_mode='r')
+        Xt_apply = np.load(os.path.join(path, APPLY_FILE), mmap_mode='r')
+        os.utime(path)
+    except FileNotFoundError:
+        # missing, or evicted by another process while reading it
+        return None
+
+    return preprocessor, Xt_fit, Xt_apply
+
+
+def save(cache_dir, key, preprocessor, Xt_fit, Xt_apply, max_bytes=MAX_BYTES):
+    """
+    Store a cache entry and evict the least recently used entries beyond max_bytes.
+    The entry is written to a temporary directory first and then renamed, so concurrent workers never see
+    a half-written entry; when another worker stored the same key first, its entry is kept.
+    :param cache_dir: cache directory
+    :param key: cache key
+    :param preprocessor: fitted preprocessor
+    :param Xt_fit: transformed X_fit
+    :param Xt_apply: transformed X_apply
+    :param max_bytes: disk budget of the cache
+    :return: (fitted preprocessor, memory-mapped X_fit, memory-mapped X_apply)
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, key)
+    tmp_path = f'{path}{TMP_MARKER}{socket.gethostname()}-{os.getpid()}'
+
+    os.makedirs(tmp_path, exist_ok=True)
+    try:
+        with open(os.path.join(tmp_path, PREPROCESSOR_FILE), 'wb') as file:
+            pickle.dump(preprocessor, file)
+        np.save(os.path.join(tmp_path, FIT_FILE), np.ascontiguousarray(Xt_fit, dtype=np.float32))
+        np.save(os.path.join(tmp_path, APPLY_FILE), np.ascontiguousarray(Xt_apply, dtype=np.float32))
+        os.rename(tmp_path, path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    evict(cache_dir, max_bytes, keep=(key,))
+    return load(cache_dir, key) or (preprocessor,
+                                    np.asarray(Xt_fit, dtype=np.float32),
+                                    np.asarray(Xt_apply, dtype=np.float32))
+
+
+def evict(cache_dir, max_bytes=MAX_BYTES, keep=()):
+    """
+    Remove the least recently used entries until the cache fits in max_bytes.
+    Temporary entries of crashed writers are removed first; those of running writers count against the budget.
+    Entries that another process removes while the cache is scanned are skipped.
+    Processes that still have an evicted entry memory-mapped keep reading it until they close it.
+    :param cache_dir: cache directory
+    :param max_bytes: disk budget of the cache
+    :param keep: keys that must not be evicted
+    :return: None
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(cache_dir):
+        try:
+            if not entry.is_dir():
+                continue
+            mtime = entry.stat().st_mtime
+            if TMP_MARKER in entry.name and _is_stale_tmp(entry.name, mtime):
+                shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            size = _entry_size(entry.path)
+        except FileNotFoundError:
+            continue
+        total += size
+        if TMP_MARKER not in entry.name:
+            entries.append((mtime, entry, size))
+
+    for _, entry, size in sorted(entries, key=lambda item: item[0]):
+        if total <= max_bytes:
+            break
+        if entry.name in keep:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        total -= size
+
+
+def fit_transform_cached(preprocessor, X_fit, X_apply, cache_dir, split='', max_bytes=MAX_BYTES):
+    """
+    Fit the preprocessor on X_fit and transform X_fit and X_apply, or reopen the result of an earlier run.
+    :param preprocessor: unfitted preprocessing pipeline
+    :param X_fit: X dataframe to fit the preprocessor on
+    :param X_apply: X dataframe to apply the fitted preprocessor to
+    :param cache_dir: cache directory
+    :param split: description of the split, e.g. its seed and fold
+    :param max_bytes: disk budget of the cache
+    :return: (fitted preprocessor, memory-mapped float32 X_fit, memory-mapped float32 X_apply)
+    """
+    key = cache_key(preprocessor, X_fit, X_apply, split)
+
+    cached = load(cache_dir, key)
+    if cached is not None:
+        return cached
+
+    Xt_fit = preprocessor.fit_transform(X_fit)
+    Xt_apply = preprocessor.transform(X_apply)
+    return save(cache_dir, key, preprocessor, Xt_fit, Xt_apply, max_bytes)
@@ -0,0 +1,248 @@
+"""
+Batch feature attribution for the fitted IsolationForest pipeline.
+
+Along the path of a sample through an isolation tree, every split moves it from a node holding n training
+samples to a child holding m of them. The expected remaining path length drops from c(n) to 1 + c(m),
+where c is the average path length of an unsuccessful BST search. That difference is credited to the feature
+of the split. Summed over the path it telescopes to c(n_root) - h(x), so the contributions of a sample
+add up (averaged over the trees) to how much shorter its path is than expected: positive contributions push
+a booking towards an anomaly, negative ones towards a normal booking.
+
+n_root is the number of distinct training samples at the root of a tree. Without bootstrap it equals
+max_samples_, so the contributions add up to c(max_samples_) - E[h(x)], which score_samples is a function of.
+With bootstrap the root holds fewer distinct samples and the sum is shifted by the same constant for every
+sample; expected_isolation gives the exact total.
+
+Every leaf determines its path, so the contributions are precomputed per tree node and gathered with
+tree.apply, in chunks that run across threads.
+"""
+import hashlib
+import pickle
+
+import numpy as np
+import pandas as pd
+from category_encoders import HashingEncoder
+from joblib import Parallel, delayed
+from sklearn.pipeline import FeatureUnion
+
+from hotelbooking.models.models_utils import split_data
+from hotelbooking.preprocessing import get_df
+from hotelbooking.transformers.dtype_union import DTypeUnion
+
+
+OTHER_CATEGORICAL = 'other_categorical'
+
+
+def _average_path_length(n_samples):
+    """
+    The average path length of an unsuccessful search in a binary search tree of n samples, c(n).
+    :param n_samples: array of node sizes
+    :return: array of average path lengths
+    """
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    path_length = np.zeros_like(n_samples)
+
+    path_length[n_samples == 2] = 1.
+    large = n_samples > 2
+    n = n_samples[large]
+    path_length[large] = 2. * (np.log(n - 1.) + np.euler_gamma) - 2. * (n - 1.) / n
+
+    return path_length
+
+
+def _node_contributions(tree):
+    """
+    Accumulate the contributions of all splits from the root down to every node of a fitted tree.
+    Nodes are processed level by level, so the loop runs once per depth instead of once per node.
+    :param tree: fitted sklearn tree (tree_ attribute of an ExtraTreeRegressor)
+    :return: array of shape (n_nodes, n_tree_features)
+    """
+    expected = _average_path_length(tree.n_node_samples)
+    table = np.zeros((tree.node_count, tree.n_features), dtype=np.float64)
+
+    parents = np.array([0])
+    while len(parents):
+        parents = parents[tree.children_left[parents] != -1]
+        for children in (tree.children_left[parents], tree.children_right[parents]):
+            table[children] = table[parents]
+            table[children, tree.feature[parents]] += expected[parents] - 1. - expected[children]
+        parents = np.concatenate([tree.children_left[parents], tree.children_right[parents]])
+
+    return table
+
+
+def _chunk_contributions(forest, tables, X):
+    contributions = np.zeros(X.shape, dtype=np.float64)
+
+    for tree, features, table in zip(forest.estimators_, forest.estimators_features_, tables):
+        X_subset = np.ascontiguousarray(X[:, features])
+        leaves = tree.apply(X_subset, check_input=False)
+        contributions[:, features] += table[leaves]
+
+    return contributions / len(forest.estimators_)
+
+
+def expected_isolation(forest):
+    """
+    The mean over the trees of c(n_root), i.e. what the contributions of a sample add up to with E[h(x)].
+    :param forest: fitted sklearn IsolationForest
+    :return: float
+    """
+    return _average_path_length([tree.tree_.n_node_samples[0] for tree in forest.estimators_]).mean()
+
+
+def path_contributions(forest, X, chunk_size=1024, n_jobs=None):
+    """
+    Per-feature contributions to the isolation of each sample, in the feature space the forest was fitted on.
+    :param forest: fitted sklearn IsolationForest
+    :param X: array of shape (n_samples, n_features) as fed to the forest
+    :param chunk_size: number of samples per chunk
+    :param n_jobs: number of threads, as in joblib
+    :return: array of shape (n_samples, n_features)
+    """
+    X = np.asarray(X, dtype=np.float32)
+    tables = [_node_contributions(tree.tree_) for tree in forest.estimators_]
+
+    chunks = Parallel(n_jobs=n_jobs, prefer='threads')(
+        delayed(_chunk_contributions)(forest, tables, X[start:start + chunk_size])
+        for start in range(0, X.shape[0], chunk_size)
+    )
+
+    return np.vstack(chunks) if chunks else np.zeros(X.shape, dtype=np.float64)
+
+
+def _feature_names(steps, names):
+    """
+    Follow the column names through the steps of a sub-pipeline.
+    """
+    for _, step in steps:
+        if hasattr(step, 'columns_'):
+            names = list(step.columns_)
+        elif hasattr(step, 'columns_to_drop_'):
+            names = [name for name in names if name not in step.columns_to_drop_]
+        elif hasattr(step, 'get_feature_names_out'):
+            names = list(step.get_feature_names_out(names))
+    return names
+
+
+def _hash_buckets(values, encoder):
+    """
+    The HashingEncoder bucket of every value, or -1 for None (which the encoder skips). Each unique value is
+    hashed once, the same way the encoder does: str(value) through hash_method, modulo n_components.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    buckets = np.array([
+        -1 if value is None else
+        int(hashlib.new(encoder.hash_method, bytes(str(value), 'utf-8')).hexdigest(), 16) % encoder.n_components
+        for value in uniques
+    ], dtype=np.intp)
+    return buckets[codes]
+
+
+def _unhash(encoder, X_in, names, contributions):
+    """
+    Map the contributions of the hashed columns back to the categorical columns that were hashed into them.
+    A bucket shared by several columns of the same booking is split evenly between them; contributions of
+    buckets no column of the booking hashed into are kept in OTHER_CATEGORICAL.
+    """
+    if contributions.shape[1] != encoder.n_components or X_in.shape[1] != len(names):
+        raise ValueError("Only a HashingEncoder that hashes all of its input columns can be attributed.")
+
+    X_in = pd.DataFrame(np.asarray(X_in, dtype=object))
+    rows = np.arange(len(X_in))
+    buckets = np.column_stack([_hash_buckets(X_in[col], encoder) for col in X_in.columns])
+
+    counts = np.zeros(contributions.shape, dtype=np.float64)
+    for bucket in buckets.T:
+        valid = bucket != -1
+        np.add.at(counts, (rows[valid], bucket[valid]), 1.)
+
+    attributed = np.zeros((len(X_in), len(names)), dtype=np.float64)
+    for i, bucket in enumerate(buckets.T):
+        valid = bucket != -1
+        attributed[valid, i] = contributions[rows[valid], bucket[valid]] / counts[rows[valid], bucket[valid]]
+
+    other = contributions.sum(axis=1) - attributed.sum(axis=1)
+    return pd.DataFrame(np.column_stack([attributed, other]), columns=list(names) + [OTHER_CATEGORICAL])
+
+
+def _blocks(union, X):
+    """
+    The sub-pipelines of the union step together with their input.
+    """
+    if isinstance(union, DTypeUnion):
+        return [(union.numerical_, X[union.numerical_columns_]),
+                (union.categorical_, X[union.categorical_columns_])]
+    if isinstance(union, FeatureUnion):
+        return [(pipe, X) for _, pipe in union.transformer_list]
+    raise ValueError(f"Cannot attribute features through a {type(union).__name__}.")
+
+
+def explain(model, X, chunk_size=1024, n_jobs=None):
+    """
+    Attribute the isolation of every booking in X to the original booking columns.
+    Contributions of scaled numerical features map one-to-one to their column; contributions of hashed
+    features are split over the categorical columns hashed into them.
+    :param model: fitted pipeline of a union step followed by an IsolationForest (see IsolationForest.pipeline)
+    :param X: X dataframe
+    :param chunk_size: number of bookings per chunk
+    :param n_jobs: number of threads, as in joblib
+    :return: dataframe of contributions, indexed like X, with one column per original booking column
+    """
+    union, forest = model.steps[0][1], model.steps[-1][1]
+
+    blocks = []
+    for pipe, X_block in _blocks(union, X):
+        steps = getattr(pipe, 'steps', [('', pipe)])
+        X_last = X_block
+        for _, step in steps[:-1]:
+            X_last = step.transform(X_last)
+        X_out = np.asarray(steps[-1][1].transform(X_last))
+        blocks.append((steps, list(X_block.columns), X_last, X_out))
+
+    contributions = path_contributions(forest, np.hstack([X_out for *_, X_out in blocks]), chunk_size, n_jobs)
+
+    frames = []
+    offset = 0
+    for steps, columns, X_last, X_out in blocks:
+        block = contributions[:, offset:offset + X_out.shape[1]]
+        offset += X_out.shape[1]
+
+        encoder = steps[-1][1]
+        names = _feature_names(steps[:-1], columns)
+        if isinstance(encoder, HashingEncoder):
+            frames.append(_unhash(encoder, X_last, names, block))
+        else:
+            names = _feature_names(steps[-1:], names)
+            if len(names) != block.shape[1]:
+                raise ValueError(f"Cannot map {block.shape[1]} features back to the columns {names}.")
+            frames.append(pd.DataFrame(block, columns=names))
+
+    return pd.concat(frames, axis=1).set_axis(X.index, axis=0)
+
+
+def explain_anomalies(model, X, chunk_size=1024, n_jobs=None):
+    """
+    Attribute only the bookings the model flags as anomalies (predict == -1).
+    :param model: fitted pipeline (see explain)
+    :param X: X dataframe
+    :param chunk_size: number of bookings per chunk
+    :param n_jobs: number of threads, as in joblib
+    :return: dataframe of contributions of the flagged bookings
+    """
+    flagged = X.loc[model.predict(X) == -1]
+    if flagged.empty:
+        # the transformers cannot run on an empty frame, so take the columns from a single booking
+        return explain(model, X.iloc[:1]).iloc[:0]
+    return explain(model, flagged, chunk_size, n_jobs)
+
+
+def run(datapath, model_version, output_path):
+    df = get_df(datapath)
+
+    X_train, X_test, y_train, y_test = split_data(df)
+
+    with open(f'src/hotelbooking/trained_models/model_{model_version}.pkl', 'rb') as file:
+        fitted_model = pickle.load(file)
+
+    explain_anomalies(fitted_model, X_test).to_csv(output_path)
@@ -1,12 +1,20 @@
 from sklearn.model_selection import train_test_split
 from sklearn.model_selection import GridSearchCV
+from sklearn.model_selection import ParameterGrid
 from sklearn.metrics import classification_report
+from hotelbooking.feature_cache import MAX_BYTES, fit_transform_cached
 from hotelbooking.preprocessing import get_df
 from hotelbooking.models import IsolationForest
+from hotelbooking.models import search_store
+from hotelbooking.utils import hash_frame
 import pickle
 from sklearn.metrics import f1_score, make_scorer
 from sklearn.model_selection import StratifiedKFold
 import pandas as pd
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 
 def split_data(df):
@@ -16,12 +24,21 @@ def split_data(df):
     return train_test_split(X, y, test_size=0.1, stratify=y, random_state=42)
 
 
+def get_fingerprint(X_train, y_train):
+    # the folds are stratified on y_train, so the labels are part of what a search store was created with
+    return hash_frame(X_train) + hash_frame(y_train)
+
+
+def get_folds(X_train, y_train):
+    skf = StratifiedKFold(n_splits=5)
+    return list(skf.split(X_train, y_train))
+
+
 def fit(model, X_train, y_train):
     clf = model.pipeline()
     f1sc = make_scorer(f1_score, pos_label=-1)
 
-    skf = StratifiedKFold(n_splits=5)
-    folds = list(skf.split(X_train, y_train))
+    folds = get_folds(X_train, y_train)
 
     gridsearch = GridSearchCV(clf, model.hyperparams(),
                               cv=folds,
@@ -36,16 +53,148 @@ def fit(model, X_train, y_train):
     return gridsearch.best_estimator_
 
 
+def _fit_score_cached(model, params, X_fold_train, y_fold_train, X_fold_test, y_fold_test, fold, cache_dir,
+                      max_bytes, scorer):
+    """
+    Fit and score only the final estimator on the cached feature matrices of a fold.
+    :return: score, or None when the parameters also touch the preprocessing steps or the cache failed
+    """
+    clf = model.pipeline()
+    estimator_name, estimator = clf.steps[-1]
+    prefix = f'{estimator_name}__'
+    if not all(name.startswith(prefix) for name in params):
+        return None
+
+    try:
+        _, Xt_fold_train, Xt_fold_test = fit_transform_cached(clf[:-1], X_fold_train, X_fold_test, cache_dir,
+                                                              split=f'StratifiedKFold(n_splits=5), fold={fold}',
+                                                              max_bytes=max_bytes)
+    except Exception:
+        # a cache problem must not fail the candidate; the caller falls back to the uncached fit
+        logger.warning(f"Feature cache failed for fold {fold}, fitting without it.", exc_info=True)
+        return None
+
+    estimator.set_params(**{name[len(prefix):]: value for name, value in params.items()})
+    estimator.fit(Xt_fold_train, y_fold_train)
+    return scorer(estimator, Xt_fold_test, y_fold_test)
+
+
+def _fit_score(model, params, X_fold_train, y_fold_train, X_fold_test, y_fold_test, fold, cache_dir, max_bytes,
+               scorer):
+    score = None
+    if cache_dir is not None:
+        score = _fit_score_cached(model, params, X_fold_train, y_fold_train, X_fold_test, y_fold_test,
+                                  fold, cache_dir, max_bytes, scorer)
+    if score is None:
+        clf = model.pipeline().set_params(**params)
+        clf.fit(X_fold_train, y_fold_train)
+        score = scorer(clf, X_fold_test, y_fold_test)
+    return score
+
+
+def work(model, X_train, y_train, store_path, lease=search_store.LEASE, poll_interval=10, cache_dir=None,
+         max_bytes=MAX_BYTES):
+    """
+    Evaluate (candidate, fold) tasks from the search store until the search is finished.
+    Any number of workers can run this against the same store, e.g. through the search-worker command.
+    :param model: model module with a pipeline function
+    :param X_train: X train dataframe
+    :param y_train: y train series
+    :param store_path: path of the search store
+    :param lease: seconds without a heartbeat after which a task is handed out again
+    :param poll_interval: seconds to wait while other workers finish the current rung (at most the lease)
+    :param cache_dir: feature cache directory, to reuse the preprocessed folds across candidates
+    :param max_bytes: disk budget of the feature cache
+    :return: None
+    """
+    conn = search_store.connect(store_path)
+    _, _, data_hash = search_store.get_settings(conn)
+    if data_hash != get_fingerprint(X_train, y_train):
+        raise ValueError("The training data does not match the data the search store was created with.")
+
+    f1sc = make_scorer(f1_score, pos_label=-1)
+    folds = get_folds(X_train, y_train)
+    worker = search_store.worker_name()
+
+    while True:
+        task = search_store.claim_task(conn, worker, lease)
+        if task is None:
+            if search_store.promote(conn):
+                continue
+            if search_store.is_finished(conn):
+                break
+            time.sleep(min(poll_interval, lease))
+            continue
+
+        candidate_id, fold, params = task
+        train_idx, test_idx = folds[fold]
+        X_fold_train, y_fold_train = X_train.iloc[train_idx], y_train.iloc[train_idx]
+        X_fold_test, y_fold_test = X_train.iloc[test_idx], y_train.iloc[test_idx]
+
+        tic = time.time()
+        try:
+            with search_store.Heartbeat(store_path, candidate_id, fold, worker, lease):
+                score = _fit_score(model, params, X_fold_train, y_fold_train, X_fold_test, y_fold_test,
+                                   fold, cache_dir, max_bytes, f1sc)
+        except Exception:
+            logger.exception(f"Fitting candidate {candidate_id} on fold {fold} failed.")
+            score = None
+        search_store.record_result(conn, candidate_id, fold, score, time.time() - tic)
+        logger.info(f"[{worker}] candidate={candidate_id}, fold={fold}, score={score}")
+
+    conn.close()
+
+
+def fit_resumable(model, X_train, y_train, store_path, eta=3, cache_dir=None, lease=search_store.LEASE,
+                  max_bytes=MAX_BYTES):
+    """
+    Checkpointed alternative to fit: every (candidate, fold) result is written to a SQLite store, so a
+    restarted search skips the work that is already done. With eta > 1 the candidates are successively
+    halved after the first folds.
+    :param model: model module with pipeline and hyperparams functions
+    :param X_train: X train dataframe
+    :param y_train: y train series
+    :param store_path: path of the search store
+    :param eta: halving rate, 1 evaluates every candidate on all folds
+    :param cache_dir: feature cache directory, to reuse the preprocessed folds across candidates
+    :param lease: seconds without a heartbeat after which a task is handed out again
+    :param max_bytes: disk budget of the feature cache
+    :return: best model (refitted on X_train)
+    """
+    conn = search_store.connect(store_path)
+    search_store.init_search(conn,
+                             ParameterGrid(model.hyperparams()),
+                             n_folds=len(get_folds(X_train, y_train)),
+                             eta=eta,
+                             data_hash=get_fingerprint(X_train, y_train))
+
+    work(model, X_train, y_train, store_path, lease=lease, cache_dir=cache_dir, max_bytes=max_bytes)
+
+    best_params, best_score = search_store.best_candidate(conn)
+    conn.close()
+    logger.info(f"Best candidate: {best_params}, score={best_score}")
+
+    return model.pipeline().set_params(**best_params).fit(X_train, y_train)
+
+
 def evaluate(y_hat, y_true):
     print(classification_report(y_true, y_hat))
 
 
-def run(datapath, model_version):
+def run(datapath, model_version, store_path=None, eta=3, cache_dir=None, lease=search_store.LEASE,
+        max_bytes=MAX_BYTES):
     df = get_df(datapath)
 
     X_train, X_test, y_train, y_test = split_data(df)
 
-    fitted_model = fit(IsolationForest, X_train, y_train)
+    if store_path is None and cache_dir is not None:
+        raise ValueError("The feature cache is only used by the resumable search; pass a store_path as well.")
+
+    if store_path is None:
+        fitted_model = fit(IsolationForest, X_train, y_train)
+    else:
+        fitted_model = fit_resumable(IsolationForest, X_train, y_train, store_path, eta, cache_dir, lease,
+                                     max_bytes)
 
     y_hat = fitted_model.predict(X_test)
 
@@ -57,3 +206,9 @@ def run(datapath, model_version):
         pickle.dump(fitted_model, file)
 
 
+def run_worker(datapath, store_path, cache_dir=None, lease=search_store.LEASE, max_bytes=MAX_BYTES):
+    df = get_df(datapath)
+
+    X_train, X_test, y_train, y_test = split_data(df)
+
+    work(IsolationForest, X_train, y_train, store_path, lease=lease, cache_dir=cache_dir, max_bytes=max_bytes)
@@ -1,5 +1,7 @@
 from sklearn.metrics import classification_report
 from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from hotelbooking.feature_cache import MAX_BYTES, fit_transform_cached
 from hotelbooking.preprocessing import get_df
 from hotelbooking.models import IsolationForest
 import pickle
@@ -20,18 +22,42 @@ def fit(model, X_train):
     return model
 
 
+def fit_cached(model, X_train, X_test, cache_dir, max_bytes=MAX_BYTES):
+    """
+    Same as fit, but the preprocessing steps and the train/test feature matrices come from the feature cache,
+    so only the final estimator is fitted when the preprocessing did not change.
+    :param model: model module with a pipeline function
+    :param X_train: X train dataframe
+    :param X_test: X test dataframe
+    :param cache_dir: feature cache directory
+    :param max_bytes: disk budget of the feature cache
+    :return: fitted pipeline, transformed X_test
+    """
+    model = model.pipeline()
+    preprocessor, Xt_train, Xt_test = fit_transform_cached(model[:-1], X_train, X_test, cache_dir,
+                                                           split='train_test_split(random_state=42)',
+                                                           max_bytes=max_bytes)
+    estimator_name, estimator = model.steps[-1]
+    estimator.fit(Xt_train)
+
+    return Pipeline(preprocessor.steps + [(estimator_name, estimator)]), Xt_test
+
+
 def evaluate(y_hat, y_true):
     print(classification_report(y_true, y_hat))
 
 
-def run(datapath, model_version):
+def run(datapath, model_version, cache_dir=None, max_bytes=MAX_BYTES):
     df = get_df(datapath)
 
     X_train, X_test, y_train, y_test = split_data(df)
 
-    fitted_model = fit(IsolationForest, X_train)
-
-    y_hat = fitted_model.predict(X_test)
+    if cache_dir is None:
+        fitted_model = fit(IsolationForest, X_train)
+        y_hat = fitted_model.predict(X_test)
+    else:
+        fitted_model, Xt_test = fit_cached(IsolationForest, X_train, X_test, cache_dir, max_bytes)
+        y_hat = fitted_model.steps[-1][1].predict(Xt_test)
 
     evaluate(y_hat, y_test)
 
@@ -0,0 +1,381 @@
+"""
+SQLite-backed store for a resumable, checkpointed hyperparameter search.
+
+Every (candidate, fold) evaluation is a task row. Workers claim pending tasks, fit and score them and write
+the result back, so a crashed or preempted search loses at most the tasks that were running at that moment.
+Any number of worker processes can share one store file; workers on several hosts can share it through a
+network filesystem that supports SQLite file locking.
+
+A claimed task is leased: the worker renews the lease with a heartbeat while it fits, and a task whose lease
+ran out, or whose worker is a process on this host that no longer exists, is handed out again.
+
+Successive halving is done over folds: all active candidates are first evaluated on the folds of rung 0,
+after which only the best 1 / eta of them are promoted to the folds of the next rung.
+"""
+import hashlib
+import json
+import math
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from hotelbooking.utils import is_dead_local_process
+
+
+LEASE = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS candidates (
+    candidate_id INTEGER PRIMARY KEY,
+    params TEXT NOT NULL UNIQUE,
+    rung INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'active'
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    candidate_id INTEGER NOT NULL REFERENCES candidates (candidate_id),
+    fold INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    score REAL,
+    fit_time REAL,
+    worker TEXT,
+    claimed_at REAL,
+    PRIMARY KEY (candidate_id, fold)
+);
+"""
+
+
+def connect(store_path, timeout=60):
+    """
+    Open (and create if needed) the search store.
+    Transactions are managed explicitly, so the connection runs in autocommit mode.
+    :param store_path: path of the SQLite file
+    :param timeout: seconds to wait for a lock held by another worker
+    :return: sqlite3 connection
+    """
+    conn = sqlite3.connect(str(store_path), timeout=timeout, isolation_level=None)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _is_dead_local_worker(worker):
+    host, _, pid = (worker or '').rpartition(':')
+    return is_dead_local_process(host, pid)
+
+
+def folds_for_rung(rung, n_folds, eta):
+    """
+    The number of folds a candidate is evaluated on at a rung; rung r uses the first eta ** r folds.
+    An eta of 1 or lower disables successive halving, so every candidate is evaluated on all folds at once.
+    :param rung: rung number
+    :param n_folds: total number of folds
+    :param eta: halving rate
+    :return: number of folds
+    """
+    if eta <= 1:
+        return n_folds
+    return min(n_folds, eta ** rung)
+
+
+def final_rung(n_folds, eta):
+    rung = 0
+    while folds_for_rung(rung, n_folds, eta) < n_folds:
+        rung += 1
+    return rung
+
+
+def _get_meta(conn):
+    return dict(conn.execute('SELECT key, value FROM meta'))
+
+
+def _enqueue(conn, candidate_ids, rung, n_folds, eta):
+    n_rung_folds = folds_for_rung(rung, n_folds, eta)
+    conn.executemany(
+        'INSERT OR IGNORE INTO tasks (candidate_id, fold) VALUES (?, ?)',
+        [(candidate_id, fold) for candidate_id in candidate_ids for fold in range(n_rung_folds)]
+    )
+
+
+def init_search(conn, candidates, n_folds, eta, data_hash):
+    """
+    Register the candidates of a search and queue their rung 0 tasks.
+    Calling this again on an existing store is a no-op for tasks that are already done, which is what makes
+    a restarted search skip them; failed tasks of the active candidates are queued again, so a transient
+    error does not drop a candidate for good.
+    :param conn: store connection
+    :param candidates: iterable of parameter dicts
+    :param n_folds: number of cross-validation folds
+    :param eta: integer halving rate
+    :param data_hash: fingerprint of the training data
+    :return: None
+    """
+    candidates = [json.dumps(params, sort_keys=True) for params in candidates]
+    settings = {
+        'n_folds': str(n_folds),
+        'eta': str(eta),
+        'data_hash': data_hash,
+        'candidates_hash': hashlib.sha1('\n'.join(sorted(candidates)).encode()).hexdigest()
+    }
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        meta = _get_meta(conn)
+        if meta and meta != settings:
+            raise ValueError(f"The search store was created with different settings: {meta}")
+        conn.executemany('INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)', settings.items())
+
+        conn.executemany(
+            'INSERT OR IGNORE INTO candidates (params) VALUES (?)',
+            [(params,) for params in candidates]
+        )
+        rung0_ids = [candidate_id for candidate_id, in conn.execute(
+            "SELECT candidate_id FROM candidates WHERE rung = 0 AND status = 'active'"
+        )]
+        _enqueue(conn, rung0_ids, 0, n_folds, eta)
+        conn.execute(
+            """
+            UPDATE tasks SET status = 'pending', score = NULL, fit_time = NULL, worker = NULL, claimed_at = NULL
+            WHERE status = 'failed'
+              AND candidate_id IN (SELECT candidate_id FROM candidates WHERE status = 'active')
+            """
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def get_settings(conn):
+    """
+    Read the settings a store was initialised with, so that extra workers can join an existing search.
+    :param conn: store connection
+    :return: n_folds, eta and data_hash
+    """
+    meta = _get_meta(conn)
+    if not meta:
+        raise ValueError("The search store has not been initialised.")
+    return int(meta['n_folds']), int(meta['eta']), meta['data_hash']
+
+
+def claim_task(conn, worker, lease=LEASE):
+    """
+    Claim a pending task of an active candidate.
+    Running tasks whose lease was not renewed for `lease` seconds, or whose worker is a dead process on this
+    host, are assumed to belong to a crashed worker and are handed out again.
+    :param conn: store connection
+    :param worker: name of the claiming worker
+    :param lease: seconds after which a running task may be reclaimed
+    :return: (candidate_id, fold, params) or None if there is nothing to do right now
+    """
+    now = time.time()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        running = conn.execute("SELECT candidate_id, fold, worker FROM tasks WHERE status = 'running'").fetchall()
+        conn.executemany(
+            "UPDATE tasks SET status = 'pending', worker = NULL WHERE candidate_id = ? AND fold = ?",
+            [(candidate_id, fold) for candidate_id, fold, owner in running if _is_dead_local_worker(owner)]
+        )
+        row = conn.execute(
+            """
+            SELECT t.candidate_id, t.fold, c.params
+            FROM tasks t JOIN candidates c USING (candidate_id)
+            WHERE c.status = 'active'
+              AND (t.status = 'pending' OR (t.status = 'running' AND t.claimed_at < ?))
+            ORDER BY t.fold, t.candidate_id
+            LIMIT 1
+            """,
+            (now - lease,)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, claimed_at = ? WHERE candidate_id = ? AND fold = ?",
+                (worker, now, row[0], row[1])
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    if row is None:
+        return None
+    return row[0], row[1], json.loads(row[2])
+
+
+def renew_lease(conn, candidate_id, fold, worker):
+    """
+    Extend the lease of a running task, as long as it is still claimed by this worker.
+    :param conn: store connection
+    :param candidate_id: candidate id
+    :param fold: fold number
+    :param worker: name of the worker holding the task
+    :return: None
+    """
+    conn.execute(
+        "UPDATE tasks SET claimed_at = ? WHERE candidate_id = ? AND fold = ? AND worker = ? AND status = 'running'",
+        (time.time(), candidate_id, fold, worker)
+    )
+
+
+class Heartbeat:
+    """
+    Context manager that renews the lease of a task from a background thread while the task is being worked on.
+    The thread uses its own connection, since SQLite connections cannot be shared between threads.
+    """
+
+    def __init__(self, store_path, candidate_id, fold, worker, lease=LEASE):
+        self.store_path = store_path
+        self.candidate_id = candidate_id
+        self.fold = fold
+        self.worker = worker
+        self.lease = lease
+
+    def __enter__(self):
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+    def _beat(self):
+        conn = connect(self.store_path)
+        try:
+            while not self._stop.wait(self.lease / 3):
+                renew_lease(conn, self.candidate_id, self.fold, self.worker)
+        finally:
+            conn.close()
+
+
+def record_result(conn, candidate_id, fold, score, fit_time):
+    """
+    Store the score of a finished task. A score of None marks a failed fit, which ranks below every other score.
+    :param conn: store connection
+    :param candidate_id: candidate id
+    :param fold: fold number
+    :param score: validation score or None
+    :param fit_time: seconds spent on fitting and scoring
+    :return: None
+    """
+    conn.execute(
+        "UPDATE tasks SET status = ?, score = ?, fit_time = ? WHERE candidate_id = ? AND fold = ?",
+        ('done' if score is not None else 'failed', score, fit_time, candidate_id, fold)
+    )
+
+
+def _rank_active(conn):
+    """
+    Rank the active candidates on their mean score over the folds evaluated so far; failed fits rank last.
+    """
+    rows = conn.execute(
+        """
+        SELECT c.candidate_id, c.params,
+               CASE WHEN SUM(t.status = 'failed') > 0 THEN NULL ELSE AVG(t.score) END AS mean_score
+        FROM candidates c JOIN tasks t USING (candidate_id)
+        WHERE c.status = 'active'
+        GROUP BY c.candidate_id
+        """
+    ).fetchall()
+    return sorted(rows, key=lambda r: (r[2] is None, -(r[2] or 0), r[0]))
+
+
+def _rung_complete(conn):
+    open_tasks, = conn.execute(
+        """
+        SELECT COUNT(*) FROM tasks t JOIN candidates c USING (candidate_id)
+        WHERE c.status = 'active' AND t.status IN ('pending', 'running')
+        """
+    ).fetchone()
+    return open_tasks == 0
+
+
+def _current_rung(conn):
+    rung, = conn.execute("SELECT MIN(rung) FROM candidates WHERE status = 'active'").fetchone()
+    return rung
+
+
+def promote(conn):
+    """
+    Close the current rung once all of its tasks are finished: keep the best 1 / eta of the active candidates,
+    prune the others and queue the folds of the next rung for the survivors.
+    :param conn: store connection
+    :return: True if a new rung was opened
+    """
+    n_folds, eta, _ = get_settings(conn)
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        rung = _current_rung(conn)
+        if rung is None or rung >= final_rung(n_folds, eta) or not _rung_complete(conn):
+            conn.execute('ROLLBACK')
+            return False
+
+        ranked = _rank_active(conn)
+        n_keep = max(1, math.ceil(len(ranked) / eta))
+        keep = [r[0] for r in ranked[:n_keep]]
+        prune = [r[0] for r in ranked[n_keep:]]
+
+        conn.executemany("UPDATE candidates SET status = 'pruned' WHERE candidate_id = ?", [(c,) for c in prune])
+        conn.executemany("UPDATE candidates SET rung = ? WHERE candidate_id = ?", [(rung + 1, c) for c in keep])
+        _enqueue(conn, keep, rung + 1, n_folds, eta)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+    return True
+
+
+def is_finished(conn):
+    """
+    The search is finished when the surviving candidates have been evaluated on all folds.
+    :param conn: store connection
+    :return: bool
+    """
+    n_folds, eta, _ = get_settings(conn)
+    rung = _current_rung(conn)
+    return rung is not None and rung >= final_rung(n_folds, eta) and _rung_complete(conn)
+
+
+def best_candidate(conn):
+    """
+    Return the parameters and mean score of the best surviving candidate.
+    :param conn: store connection
+    :return: params, mean score
+    """
+    ranked = _rank_active(conn)
+    if not ranked:
+        raise ValueError("The search store does not contain any evaluated candidates.")
+    _, params, score = ranked[0]
+    if score is None:
+        raise ValueError("All surviving candidates failed; see the worker logs and restart the search to retry them.")
+    return json.loads(params), score
+
+
+def results(conn):
+    """
+    All task results of the search, e.g. to inspect a running search from a notebook.
+    :param conn: store connection
+    :return: dataframe with one row per (candidate, fold)
+    """
+    import pandas as pd
+
+    return pd.read_sql(
+        """
+        SELECT c.candidate_id, c.params, c.rung, c.status AS candidate_status,
+               t.fold, t.status AS task_status, t.score, t.fit_time, t.worker
+        FROM candidates c LEFT JOIN tasks t USING (candidate_id)
+        ORDER BY c.candidate_id, t.fold
+        """,
+        conn
+    )
@@ -1,22 +1,24 @@
 from sklearn.base import BaseEstimator, TransformerMixin
+import numpy as np
 import pandas as pd
 
+from hotelbooking.transformers.column_indexer import resolve_columns, resolve_positions, take_columns
+
 
 class ColumnDropper(BaseEstimator, TransformerMixin):
     """
-    The ColumnSelector transformer selects certain specified columns in order to supply them to other transformers.
+    The ColumnDropper transformer drops certain specified columns before supplying the rest to other transformers.
     """
     def __init__(self, columns):
         self.columns = columns
 
     def fit(self, X, y=None):
+        assert isinstance(X, pd.DataFrame)
+
+        keep = np.ones(X.shape[1], dtype=bool)
+        keep[resolve_positions(X, self.columns)] = False
+        self.columns_, self.indexer_, self.kinds_ = resolve_columns(X, X.columns[keep])
         return self
 
     def transform(self, X):
-        assert isinstance(X, pd.DataFrame)
-
-        try:
-            return X.drop(columns=self.columns)
-        except KeyError:
-            cols_error = list(set(self.columns) - set(X.columns))
-            raise KeyError("The DataFrame does not include the columns: %s" % cols_error)
\ No newline at end of file
+        return take_columns(X, self.columns_, self.indexer_, self.kinds_)
@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+
+
+def resolve_positions(X, columns):
+    """
+    Look up the positions of columns in a dataframe.
+    :param X: X dataframe
+    :param columns: column names
+    :return: array of column positions
+    """
+    positions = X.columns.get_indexer(columns)
+    missing = [col for col, pos in zip(columns, positions) if pos == -1]
+    if missing:
+        raise KeyError("The DataFrame does not include the columns: %s" % missing)
+    return positions
+
+
+def as_indexer(positions):
+    """
+    Turn column positions into a slice when they are contiguous and ascending, so that .iloc returns a view
+    of the underlying block instead of taking a copy.
+    :param positions: array of column positions
+    :return: slice or array of column positions
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    if len(positions) and np.array_equal(positions, np.arange(positions[0], positions[0] + len(positions))):
+        return slice(int(positions[0]), int(positions[0]) + len(positions))
+    return positions
+
+
+def _numeric_kinds(dtypes):
+    return np.array([pd.api.types.is_numeric_dtype(dtype) for dtype in dtypes], dtype=bool)
+
+
+def resolve_columns(X, columns):
+    """
+    Resolve columns once at fit time.
+    :param X: X dataframe
+    :param columns: column names
+    :return: column index, indexer (see as_indexer) and whether each column is numeric
+    """
+    assert isinstance(X, pd.DataFrame)
+
+    indexer = as_indexer(resolve_positions(X, columns))
+    return X.columns[indexer], indexer, _numeric_kinds(X.dtypes.iloc[indexer])
+
+
+def resolve_dtypes(X, dtypes):
+    """
+    Resolve the columns of certain dtypes once at fit time.
+    select_dtypes runs on an empty slice, so it only inspects the dtypes and not the data.
+    :param X: X dataframe
+    :param dtypes: dtypes as accepted by select_dtypes
+    :return: column index, indexer (see as_indexer) and whether each column is numeric
+    """
+    assert isinstance(X, pd.DataFrame)
+
+    return resolve_columns(X, X.iloc[:0].select_dtypes(dtypes).columns)
+
+
+def take_columns(X, columns, indexer, kinds):
+    """
+    Select the columns resolved at fit time.
+    The schema check only compares the column names at the stored positions, and whether each column is still
+    numeric or not: an int column arriving as float, or an object column arriving as str, passes. When the
+    columns were reordered since fit, the positions are looked up again by name.
+    :param X: X dataframe
+    :param columns: column names resolved at fit time
+    :param indexer: slice or array of column positions resolved at fit time
+    :param kinds: whether each column was numeric at fit time
+    :return: X dataframe with the selected columns
+    """
+    assert isinstance(X, pd.DataFrame)
+
+    try:
+        unchanged = X.columns[indexer].equals(columns)
+    except IndexError:
+        unchanged = False
+
+    if not unchanged:
+        indexer = as_indexer(resolve_positions(X, columns))
+
+    changed = _numeric_kinds(X.dtypes.iloc[indexer]) != kinds
+    if changed.any():
+        raise TypeError("The dtypes of the columns changed since fit: %s" % list(columns[changed]))
+    return X.iloc[:, indexer]
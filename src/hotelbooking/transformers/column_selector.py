@@ -1,5 +1,6 @@
 from sklearn.base import BaseEstimator, TransformerMixin
-import pandas as pd
+
+from hotelbooking.transformers.column_indexer import resolve_columns, take_columns
 
 
 class ColumnSelector(BaseEstimator, TransformerMixin):
@@ -10,13 +11,8 @@ class ColumnSelector(BaseEstimator, TransformerMixin):
         self.columns = columns
 
     def fit(self, X, y=None):
+        self.columns_, self.indexer_, self.kinds_ = resolve_columns(X, self.columns)
         return self
 
     def transform(self, X):
-        assert isinstance(X, pd.DataFrame)
-
-        try:
-            return X[self.columns]
-        except KeyError:
-            cols_error = list(set(self.columns) - set(X.columns))
-            raise KeyError("The DataFrame does not include the columns: %s" % cols_error)
\ No newline at end of file
+        return take_columns(X, self.columns_, self.indexer_, self.kinds_)
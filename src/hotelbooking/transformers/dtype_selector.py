@@ -1,13 +1,20 @@
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from hotelbooking.transformers.column_indexer import resolve_dtypes, take_columns
+
 
 class DTypeSelector(BaseEstimator, TransformerMixin):
+    """
+    The DTypeSelector transformer selects the columns of certain dtypes.
+    The columns are resolved once in fit, so transform only has to index them by position.
+    """
 
     def __init__(self, dtypes):
         self.dtypes = dtypes
 
     def fit(self, X, y=None):
+        self.columns_, self.indexer_, self.kinds_ = resolve_dtypes(X, self.dtypes)
         return self
 
     def transform(self, X):
-        return X.select_dtypes(self.dtypes)
+        return take_columns(X, self.columns_, self.indexer_, self.kinds_)
@@ -0,0 +1,58 @@
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+import numpy as np
+
+from hotelbooking.transformers.column_indexer import resolve_dtypes, take_columns
+
+
+class DTypeUnion(BaseEstimator, TransformerMixin):
+    """
+    The DTypeUnion transformer is a fused alternative to
+    make_union(make_pipeline(DTypeSelector('number'), ...), make_pipeline(DTypeSelector('object'), ...)).
+    The numerical and categorical blocks are resolved together in fit, and transform checks the schema of each
+    block before handing it to its own transformer and stacking the results.
+    """
+
+    def __init__(self, numerical, categorical, numerical_dtypes='number', categorical_dtypes='object'):
+        """
+        :param numerical: transformer (or pipeline) for the numerical block
+        :param categorical: transformer (or pipeline) for the categorical block
+        :param numerical_dtypes: dtypes of the numerical block, as accepted by select_dtypes
+        :param categorical_dtypes: dtypes of the categorical block, as accepted by select_dtypes
+        """
+        self.numerical = numerical
+        self.categorical = categorical
+        self.numerical_dtypes = numerical_dtypes
+        self.categorical_dtypes = categorical_dtypes
+
+    def fit(self, X, y=None):
+        X_num, X_cat = self._resolve(X)
+        self.numerical_ = clone(self.numerical).fit(X_num, y)
+        self.categorical_ = clone(self.categorical).fit(X_cat, y)
+        return self
+
+    def fit_transform(self, X, y=None):
+        X_num, X_cat = self._resolve(X)
+        self.numerical_ = clone(self.numerical)
+        self.categorical_ = clone(self.categorical)
+        return np.hstack([
+            np.asarray(self.numerical_.fit_transform(X_num, y)),
+            np.asarray(self.categorical_.fit_transform(X_cat, y))
+        ])
+
+    def transform(self, X):
+        X_num, X_cat = self._split(X)
+        return np.hstack([
+            np.asarray(self.numerical_.transform(X_num)),
+            np.asarray(self.categorical_.transform(X_cat))
+        ])
+
+    def _resolve(self, X):
+        self.numerical_columns_, self.numerical_indexer_, self.numerical_kinds_ = \
+            resolve_dtypes(X, self.numerical_dtypes)
+        self.categorical_columns_, self.categorical_indexer_, self.categorical_kinds_ = \
+            resolve_dtypes(X, self.categorical_dtypes)
+        return X.iloc[:, self.numerical_indexer_], X.iloc[:, self.categorical_indexer_]
+
+    def _split(self, X):
+        return (take_columns(X, self.numerical_columns_, self.numerical_indexer_, self.numerical_kinds_),
+                take_columns(X, self.categorical_columns_, self.categorical_indexer_, self.categorical_kinds_))
@@ -1,7 +1,12 @@
 from functools import wraps
+import hashlib
 import logging
+import os
+import socket
 import datetime as dt
 
+import pandas as pd
+
 def log_step(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -15,5 +20,36 @@ def log_step(func):
     return wrapper
 
 
+def is_dead_local_process(host, pid):
+    """
+    Whether a process id on a host points to a process on this host that is no longer alive.
+    Processes on other hosts cannot be checked and are never reported as dead.
+    :param host: host name
+    :param pid: process id (int or digit string)
+    :return: bool
+    """
+    if host != socket.gethostname() or not str(pid).isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        return False
+    return False
+
+
+def hash_frame(df):
+    """
+    Compute a stable fingerprint of a dataframe or series (values, index and column names).
+    :param df: dataframe or series
+    :return: hex digest
+    """
+    digest = hashlib.sha1(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    names = df.columns if isinstance(df, pd.DataFrame) else [df.name]
+    digest.update(repr(list(names)).encode())
+    return digest.hexdigest()
+
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
\ No newline at end of file
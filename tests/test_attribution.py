@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+from category_encoders import HashingEncoder
+
+from hotelbooking.models import IsolationForest
+from hotelbooking.models import attribution
+
+
+@pytest.fixture
+def bookings():
+    rng = np.random.default_rng(0)
+    n = 600
+    X = pd.DataFrame({
+        'lead_time': rng.exponential(50, n),
+        'adults': rng.integers(1, 4, n).astype(float),
+        'adr': rng.normal(100, 20, n),
+        'hotel': rng.choice(['City Hotel', 'Resort Hotel'], n).astype(object),
+        'country': rng.choice(['PRT', 'GBR', 'FRA', 'ESP'], n).astype(object),
+        'meal': rng.choice(['BB', 'HB', 'SC'], n).astype(object),
+    })
+    X.loc[::40, 'adr'] = np.nan
+    return X
+
+
+def expected_total(model, X):
+    forest = model.steps[-1][1]
+    c_max_samples = attribution._average_path_length([forest.max_samples_])[0]
+    mean_path_length = -np.log2(-model.score_samples(X)) * c_max_samples
+    return attribution.expected_isolation(forest) - mean_path_length
+
+
+@pytest.mark.parametrize('bootstrap', [False, True])
+def test_contributions_add_up_to_score(bookings, bootstrap):
+    model = IsolationForest.pipeline().set_params(isolationforest__n_estimators=50,
+                                                  isolationforest__bootstrap=bootstrap)
+    model.fit(bookings)
+
+    contributions = attribution.explain(model, bookings, chunk_size=128, n_jobs=2)
+
+    assert contributions.index.equals(bookings.index)
+    assert set(contributions.columns) >= {'hotel', 'country', 'meal', attribution.OTHER_CATEGORICAL}
+    np.testing.assert_allclose(contributions.sum(axis=1), expected_total(model, bookings), atol=1e-9)
+
+
+def test_explain_anomalies_only_returns_flagged(bookings):
+    model = IsolationForest.pipeline().set_params(isolationforest__n_estimators=50,
+                                                  isolationforest__contamination=0.05)
+    model.fit(bookings)
+
+    contributions = attribution.explain_anomalies(model, bookings)
+
+    assert contributions.index.equals(bookings.index[model.predict(bookings) == -1])
+
+
+def test_hash_buckets_match_hashing_encoder(bookings):
+    categorical = bookings.select_dtypes('object')
+    encoder = HashingEncoder(n_components=8).fit(categorical)
+
+    counts = np.zeros((len(categorical), encoder.n_components))
+    for col in categorical.columns:
+        np.add.at(counts, (np.arange(len(categorical)), attribution._hash_buckets(categorical[col], encoder)), 1)
+
+    np.testing.assert_array_equal(counts, np.asarray(encoder.transform(categorical)))
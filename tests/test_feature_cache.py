@@ -0,0 +1,100 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+from sklearn.metrics import f1_score, make_scorer
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import RobustScaler
+from sklearn.ensemble import IsolationForest
+
+from hotelbooking import feature_cache
+from hotelbooking.cli import main
+from hotelbooking.models import model_utils_GS
+
+
+@pytest.fixture
+def frames():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(200, 3)), columns=['a', 'b', 'c'])
+    return X.iloc[:150], X.iloc[150:]
+
+
+def test_reopens_memory_mapped_float32(tmp_path, frames):
+    X_fit, X_apply = frames
+
+    _, Xt_fit, _ = feature_cache.fit_transform_cached(make_pipeline(RobustScaler()), X_fit, X_apply, tmp_path)
+    with mock.patch.object(RobustScaler, 'fit', side_effect=AssertionError('refitted')):
+        preprocessor, Xt_fit_again, Xt_apply = feature_cache.fit_transform_cached(
+            make_pipeline(RobustScaler()), X_fit, X_apply, tmp_path)
+
+    assert isinstance(Xt_fit_again, np.memmap) and Xt_fit_again.dtype == np.float32
+    np.testing.assert_array_equal(Xt_fit, Xt_fit_again)
+    np.testing.assert_allclose(Xt_apply, preprocessor.transform(X_apply), rtol=1e-6)
+
+
+def test_evicts_least_recently_used(tmp_path, frames):
+    X_fit, X_apply = frames
+    for seed in range(3):
+        feature_cache.fit_transform_cached(make_pipeline(RobustScaler()), X_fit, X_apply, tmp_path, split=str(seed))
+        time.sleep(0.01)
+    keys = [feature_cache.cache_key(make_pipeline(RobustScaler()), X_fit, X_apply, str(seed)) for seed in range(3)]
+    feature_cache.load(tmp_path, keys[0])
+
+    entry_size = feature_cache._entry_size(tmp_path / keys[0])
+    feature_cache.evict(tmp_path, max_bytes=2 * entry_size)
+
+    assert sorted(os.listdir(tmp_path)) == sorted([keys[0], keys[2]])
+
+
+def test_removes_temporary_entries_of_crashed_writers(tmp_path):
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    stale = tmp_path / f'key{feature_cache.TMP_MARKER}{socket.gethostname()}-{process.pid}'
+    running = tmp_path / f'key{feature_cache.TMP_MARKER}{socket.gethostname()}-{os.getpid()}'
+    for path in (stale, running):
+        path.mkdir()
+        (path / 'X_fit.npy').write_bytes(b'0' * 100)
+
+    feature_cache.evict(tmp_path, max_bytes=0)
+
+    assert os.listdir(tmp_path) == [running.name]
+
+
+def test_evict_skips_entries_removed_concurrently(tmp_path, frames):
+    X_fit, X_apply = frames
+    feature_cache.fit_transform_cached(make_pipeline(RobustScaler()), X_fit, X_apply, tmp_path)
+
+    with mock.patch.object(feature_cache, '_entry_size', side_effect=FileNotFoundError):
+        feature_cache.evict(tmp_path, max_bytes=0)
+
+
+def test_cache_failure_falls_back_to_uncached_fit(tmp_path, frames):
+    X, _ = frames
+    y = pd.Series(np.where(np.arange(len(X)) % 10 == 0, -1, 1))
+    model = type('Model', (), {
+        'pipeline': staticmethod(lambda: make_pipeline(RobustScaler(), IsolationForest(n_estimators=10,
+                                                                                       random_state=42)))
+    })
+    scorer = make_scorer(f1_score, pos_label=-1)
+    params = {'isolationforest__contamination': 0.1}
+    args = (model, params, X.iloc[:100], y.iloc[:100], X.iloc[100:], y.iloc[100:], 0, tmp_path,
+            feature_cache.MAX_BYTES, scorer)
+
+    with mock.patch.object(model_utils_GS, 'fit_transform_cached', side_effect=OSError('disk full')):
+        assert model_utils_GS._fit_score_cached(*args) is None
+        assert model_utils_GS._fit_score(*args) is not None
+
+
+def test_optimise_model_rejects_cache_without_store(tmp_path):
+    result = CliRunner().invoke(main, ['optimise-model', '--data-path', __file__, '--model-version', '1',
+                                       '--cache-dir', str(tmp_path)])
+
+    assert result.exit_code == 2
+    assert '--store-path' in result.output
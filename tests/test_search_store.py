@@ -0,0 +1,195 @@
+import socket
+import subprocess
+import sys
+import time
+import types
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import RobustScaler
+
+from hotelbooking.models import model_utils_GS
+from hotelbooking.models import search_store
+
+
+def dead_local_worker():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return f'{socket.gethostname()}:{process.pid}'
+
+
+def run_to_completion(conn, worker='w:1'):
+    n_tasks = 0
+    while True:
+        task = search_store.claim_task(conn, worker)
+        if task is None:
+            if search_store.promote(conn):
+                continue
+            assert search_store.is_finished(conn)
+            return n_tasks
+        candidate_id, fold, params = task
+        search_store.record_result(conn, candidate_id, fold, float(params['a']), 0.)
+        n_tasks += 1
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = search_store.connect(tmp_path / 'search.db')
+    yield conn
+    conn.close()
+
+
+def test_successive_halving_counts(conn):
+    search_store.init_search(conn, [{'a': i} for i in range(10)], n_folds=5, eta=3, data_hash='h')
+
+    # rung 0: 10 x 1 fold, rung 1: 4 x 2 new folds, rung 2: 2 x 2 new folds
+    assert run_to_completion(conn) == 10 + 8 + 4
+
+    results = search_store.results(conn)
+    assert results.groupby('candidate_status')['candidate_id'].nunique().to_dict() == {'active': 2, 'pruned': 8}
+    assert search_store.best_candidate(conn) == ({'a': 9}, 9.)
+
+
+def test_without_halving_every_candidate_gets_all_folds(conn):
+    search_store.init_search(conn, [{'a': i} for i in range(4)], n_folds=5, eta=1, data_hash='h')
+
+    assert run_to_completion(conn) == 4 * 5
+    assert search_store.best_candidate(conn) == ({'a': 3}, 3.)
+
+
+def test_failed_candidate_ranks_last(conn):
+    search_store.init_search(conn, [{'a': 1}, {'a': 2}], n_folds=1, eta=1, data_hash='h')
+
+    while (task := search_store.claim_task(conn, 'w:1')) is not None:
+        candidate_id, fold, params = task
+        search_store.record_result(conn, candidate_id, fold, None if params['a'] == 2 else 0.5, 0.)
+
+    assert search_store.best_candidate(conn) == ({'a': 1}, 0.5)
+
+
+def test_all_candidates_failed_raises(conn):
+    search_store.init_search(conn, [{'a': 1}], n_folds=1, eta=1, data_hash='h')
+    candidate_id, fold, _ = search_store.claim_task(conn, 'w:1')
+    search_store.record_result(conn, candidate_id, fold, None, 0.)
+
+    with pytest.raises(ValueError):
+        search_store.best_candidate(conn)
+
+
+def test_restart_retries_failed_tasks(conn):
+    candidates = [{'a': i} for i in range(3)]
+    search_store.init_search(conn, candidates, n_folds=1, eta=1, data_hash='h')
+    candidate_id, fold, _ = search_store.claim_task(conn, 'w:1')
+    search_store.record_result(conn, candidate_id, fold, None, 0.)
+
+    search_store.init_search(conn, candidates, n_folds=1, eta=1, data_hash='h')
+
+    assert run_to_completion(conn) == 3
+    assert (search_store.results(conn)['task_status'] == 'done').all()
+
+
+def test_restart_skips_finished_tasks(conn):
+    candidates = [{'a': i} for i in range(3)]
+    search_store.init_search(conn, candidates, n_folds=1, eta=1, data_hash='h')
+    candidate_id, fold, _ = search_store.claim_task(conn, 'w:1')
+    search_store.record_result(conn, candidate_id, fold, 1., 0.)
+
+    search_store.init_search(conn, candidates, n_folds=1, eta=1, data_hash='h')
+
+    assert run_to_completion(conn) == 2
+
+
+@pytest.mark.parametrize('settings', [
+    dict(n_folds=3, eta=3, data_hash='h'),
+    dict(n_folds=5, eta=2, data_hash='h'),
+    dict(n_folds=5, eta=3, data_hash='other'),
+])
+def test_resume_with_different_settings_raises(conn, settings):
+    search_store.init_search(conn, [{'a': 1}], n_folds=5, eta=3, data_hash='h')
+
+    with pytest.raises(ValueError):
+        search_store.init_search(conn, [{'a': 1}], **settings)
+
+
+def test_resume_with_different_candidates_raises(conn):
+    search_store.init_search(conn, [{'a': 1}], n_folds=5, eta=3, data_hash='h')
+
+    with pytest.raises(ValueError):
+        search_store.init_search(conn, [{'a': 1}, {'a': 2}], n_folds=5, eta=3, data_hash='h')
+
+
+def test_task_of_dead_local_worker_is_reclaimed_immediately(conn):
+    search_store.init_search(conn, [{'a': 1}], n_folds=1, eta=1, data_hash='h')
+    search_store.claim_task(conn, dead_local_worker())
+
+    assert search_store.claim_task(conn, 'w:1', lease=3600) is not None
+
+
+def test_task_of_remote_worker_is_reclaimed_after_lease(conn):
+    search_store.init_search(conn, [{'a': 1}], n_folds=1, eta=1, data_hash='h')
+    search_store.claim_task(conn, 'otherhost:1')
+
+    assert search_store.claim_task(conn, 'w:1', lease=3600) is None
+    time.sleep(0.05)
+    assert search_store.claim_task(conn, 'w:1', lease=0.01) is not None
+
+
+def test_heartbeat_renews_lease(tmp_path, conn):
+    search_store.init_search(conn, [{'a': 1}], n_folds=1, eta=1, data_hash='h')
+    candidate_id, fold, _ = search_store.claim_task(conn, 'otherhost:1')
+
+    with search_store.Heartbeat(tmp_path / 'search.db', candidate_id, fold, 'otherhost:1', lease=0.3):
+        time.sleep(0.5)
+        assert search_store.claim_task(conn, 'w:1', lease=0.3) is None
+
+
+@pytest.fixture
+def bookings():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(300, 3)), columns=['a', 'b', 'c'])
+    y = pd.Series(np.where(rng.random(300) < 0.1, -1, 1))
+    return X, y
+
+
+def small_model():
+    return types.SimpleNamespace(
+        pipeline=lambda: make_pipeline(RobustScaler(), IsolationForest(n_estimators=10, random_state=42)),
+        hyperparams=lambda: {'isolationforest__contamination': [0.05, 0.1, 0.2]}
+    )
+
+
+def test_fit_resumable_resumes_after_crash(tmp_path, bookings):
+    X, y = bookings
+    store_path = tmp_path / 'search.db'
+
+    conn = search_store.connect(store_path)
+    search_store.init_search(conn, model_utils_GS.ParameterGrid(small_model().hyperparams()),
+                             n_folds=5, eta=1, data_hash=model_utils_GS.get_fingerprint(X, y))
+    # a crashed worker left one task running and finished another
+    search_store.claim_task(conn, dead_local_worker())
+    candidate_id, fold, _ = search_store.claim_task(conn, 'w:1')
+    search_store.record_result(conn, candidate_id, fold, 0.5, 0.)
+
+    tic = time.time()
+    fitted = model_utils_GS.fit_resumable(small_model(), X, y, store_path, eta=1)
+    assert time.time() - tic < 30
+
+    results = search_store.results(conn)
+    assert (results['task_status'] == 'done').all()
+    assert results.loc[lambda d: d['worker'] == 'w:1', 'score'].tolist() == [0.5]
+    assert fitted.predict(X).shape == (300,)
+    conn.close()
+
+
+def test_work_rejects_other_data(tmp_path, bookings):
+    X, y = bookings
+    store_path = tmp_path / 'search.db'
+    model_utils_GS.fit_resumable(small_model(), X, y, store_path, eta=3)
+
+    with pytest.raises(ValueError):
+        model_utils_GS.work(small_model(), X.iloc[:-1], y.iloc[:-1], store_path)
+    with pytest.raises(ValueError):
+        model_utils_GS.work(small_model(), X, -y, store_path)
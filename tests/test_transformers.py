@@ -0,0 +1,99 @@
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.impute import KNNImputer, SimpleImputer
+from sklearn.pipeline import make_pipeline, make_union
+from sklearn.preprocessing import OneHotEncoder, RobustScaler
+
+from hotelbooking.models import IsolationForest
+from hotelbooking.transformers.column_dropper import ColumnDropper
+from hotelbooking.transformers.column_selector import ColumnSelector
+from hotelbooking.transformers.dtype_selector import DTypeSelector
+from hotelbooking.transformers.dtype_union import DTypeUnion
+
+
+@pytest.fixture
+def X():
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'a': rng.normal(size=50),
+        'b': rng.integers(0, 5, 50),
+        'hotel': rng.choice(['x', 'y'], 50).astype(object),
+        'c': rng.normal(size=50),
+    })
+
+
+def test_selectors_resolve_columns_at_fit(X):
+    assert DTypeSelector('number').fit(X).transform(X).columns.tolist() == ['a', 'b', 'c']
+    assert ColumnSelector(['c', 'a']).fit(X).transform(X).columns.tolist() == ['c', 'a']
+    assert ColumnDropper(['hotel']).fit(X).transform(X).columns.tolist() == ['a', 'b', 'c']
+
+
+def test_selectors_follow_reordered_columns(X):
+    selector = ColumnSelector(['c', 'a']).fit(X)
+
+    assert selector.transform(X[X.columns[::-1]]).equals(X[['c', 'a']])
+
+
+def test_missing_column_raises(X):
+    with pytest.raises(KeyError):
+        ColumnSelector(['missing']).fit(X)
+    with pytest.raises(KeyError):
+        ColumnSelector(['a']).fit(X).transform(X.drop(columns='a'))
+
+
+def test_dtype_within_the_same_family_passes(X):
+    selector = DTypeSelector('number').fit(X.assign(b=X['b'].astype(float)))
+    scoring = X.assign(hotel=X['hotel'].astype(str))
+
+    assert selector.transform(scoring).columns.tolist() == ['a', 'b', 'c']
+    assert DTypeSelector('object').fit(X).transform(scoring).columns.tolist() == ['hotel']
+
+
+def test_dtype_of_another_family_raises(X):
+    with pytest.raises(TypeError):
+        DTypeSelector('number').fit(X).transform(X.assign(b=X['b'].astype(str)))
+    with pytest.raises(TypeError):
+        ColumnSelector(['hotel']).fit(X).transform(X.assign(hotel=1))
+
+
+def test_pipeline_scores_a_batch_built_from_records():
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({
+        'lead_time': rng.exponential(50, 200),
+        'children': rng.integers(0, 3, 200).astype(float),
+        'hotel': rng.choice(['City Hotel', 'Resort Hotel'], 200).astype(object),
+    })
+    X.loc[::20, 'children'] = np.nan
+    model = IsolationForest.pipeline().set_params(isolationforest__n_estimators=10).fit(X)
+
+    batch = pd.DataFrame.from_records([{'lead_time': 3.0, 'children': 1, 'hotel': 'City Hotel'}])
+
+    assert model.predict(batch).shape == (1,)
+
+
+def numerical():
+    return make_pipeline(KNNImputer(), RobustScaler())
+
+
+def categorical():
+    return make_pipeline(SimpleImputer(strategy='most_frequent'), OneHotEncoder(sparse_output=False))
+
+
+def test_dtype_union_matches_make_union(X):
+    union = make_union(make_pipeline(DTypeSelector('number'), numerical()),
+                       make_pipeline(DTypeSelector('object'), categorical()))
+    fused = DTypeUnion(numerical(), categorical())
+
+    expected = union.fit_transform(X)
+    np.testing.assert_allclose(fused.fit_transform(X), expected)
+    np.testing.assert_allclose(fused.transform(X), expected)
+
+
+def test_dtype_union_fit_transform_transforms_once(X):
+    with mock.patch.object(KNNImputer, 'transform', autospec=True, side_effect=KNNImputer.transform) as transform:
+        DTypeUnion(numerical(), categorical()).fit_transform(X)
+
+    assert transform.call_count == 1